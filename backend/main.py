@@ -6,42 +6,77 @@ Target: <2GB VRAM usage, low latency responses
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List, Dict, Any, AsyncGenerator, Union
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import Optional, List, Dict, Tuple, AsyncGenerator
 import httpx
+import asyncio
 import logging
+import logging.handlers
 import time
 import os
-import json
+import queue
+import collections
+import itertools
+import orjson
 from datetime import datetime
+from mimetypes import guess_type
+
+class RingHandler(logging.Handler):
+    """Keep the most recent formatted log lines in memory for /logs/recent"""
+    
+    def __init__(self, capacity: int = 2000):
+        super().__init__()
+        self.buf = collections.deque(maxlen=capacity)
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.buf.append(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
 
 # Configure logging
+# Records are only enqueued on the event loop; a background listener thread does the actual writes
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+file_handler = logging.handlers.RotatingFileHandler('chatbot.log', maxBytes=50_000_000, backupCount=5)
+file_handler.setFormatter(log_formatter)
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(log_formatter)
+ring_handler = RingHandler()
+ring_handler.setFormatter(log_formatter)
+
+log_queue = queue.Queue(-1)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Full formatting happens on the listener side
+log_listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, ring_handler, respect_handler_level=True)
 logging.basicConfig(
-    level=logging.DEBUG,  # Changed from INFO to DEBUG
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('chatbot.log'),
-        logging.StreamHandler()
-    ]
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    handlers=[queue_handler]
 )
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI
-app = FastAPI(
-    title="Ultra-Lightweight Coding Chatbot",
-    description="Optimized for low VRAM usage and fast responses",
-    version="1.0.0"
-)
+# SSE framing, built once instead of per token
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+_SSE_FRAME = b"data: %b\n\n"  # %-formatting builds the frame in one allocation, unlike prefix + payload + suffix
+_SSE_DONE = b'data: {"done":true}\n\n'
+# Ollama's compact encoding of a keepalive chunk with nothing to show (no tool calls or thinking either)
+_OLLAMA_EMPTY_MESSAGE = b'"message":{"role":"assistant","content":""},'
+_OLLAMA_NOT_DONE = b'"done":false'
+_SSE_HEARTBEAT = b":\n\n"  # SSE comment, ignored by the frontend
+# Stop proxies (nginx) and caches from buffering the token stream
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Connection": "keep-alive"}
 
-# Add CORS middleware AFTER app is defined
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # for dev; narrow down later if you want
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def _sse_err(msg: str) -> bytes:
+    """Build an SSE error frame the frontend can parse"""
+    return _SSE_FRAME % orjson.dumps({"error": msg})
 
 # Configuration
 class Config:
@@ -51,45 +86,143 @@ class Config:
     MAX_TOKENS = int(os.getenv("MAX_TOKENS", "2048"))
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
     MOCK_MODE = os.getenv("MOCK_MODE", "false").lower() == "true"
+    STREAM_DEBUG = os.getenv("STREAM_DEBUG", "false").lower() == "true"  # Parse Ollama chunks instead of forwarding them
     REQUEST_TIMEOUT = 120.0
+    HEALTH_CACHE_TTL = 3.0  # Seconds a backend health probe result is reused
+    SSE_HEARTBEAT_INTERVAL = 10.0  # Seconds of upstream silence before a keep-alive comment is sent
+    OLLAMA_COALESCE_MS = float(os.getenv("OLLAMA_COALESCE_MS", "10"))  # Batch Ollama frames within this window; 0 disables
+    COALESCE_MAX_BYTES = 512  # Flush a batch early once it reaches this size
+    MAX_BODY_BYTES = 4 * 1024 * 1024  # Larger requests are rejected before the body is read
+    MAX_MESSAGES = 128
+    MAX_MESSAGE_CHARS = 32_768
 
 config = Config()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the backend HTTP clients and log startup information"""
+    # Started and stopped as a pair so the app can go through its lifespan more than once;
+    # records logged before startup wait in the queue until the listener drains them
+    log_listener.start()
+    
+    # One pooled client per backend, living as long as the app, so the same keep-alive
+    # sockets are reused across a whole chat session instead of reconnecting every turn
+    backend_limits = httpx.Limits(max_keepalive_connections=8, max_connections=16, keepalive_expiry=300)
+    app.state.ollama = httpx.AsyncClient(
+        base_url=config.OLLAMA_BASE_URL,
+        timeout=config.REQUEST_TIMEOUT,
+        limits=backend_limits
+    )
+    app.state.vllm = httpx.AsyncClient(
+        base_url=config.VLLM_BASE_URL,
+        timeout=config.REQUEST_TIMEOUT,
+        limits=backend_limits
+    )
+    
+    logger.info("="*50)
+    logger.info("Ultra-Lightweight Coding Chatbot Started")
+    default_backend, default_model = current_state
+    logger.info(f"Default Backend: {default_backend}")
+    logger.info(f"Default Model: {default_model}")
+    logger.info(f"Ollama URL: {config.OLLAMA_BASE_URL}")
+    logger.info(f"vLLM URL: {config.VLLM_BASE_URL}")
+    logger.info(f"Mock Mode: {config.MOCK_MODE}")
+    logger.info("="*50)
+    
+    # Check backend availability
+    ollama_ok = await check_ollama_health(app.state.ollama)
+    vllm_ok = await check_vllm_health()
+    
+    if not ollama_ok and not vllm_ok and not config.MOCK_MODE:
+        logger.warning("⚠️  No backends available! Enable MOCK_MODE or start Ollama/vLLM")
+    elif ollama_ok:
+        logger.info("✓ Ollama is available")
+    elif vllm_ok:
+        logger.info("✓ vLLM is available")
+    
+    try:
+        yield
+    finally:
+        await app.state.ollama.aclose()
+        await app.state.vllm.aclose()
+        log_listener.stop()
+
+class BodySizeLimitMiddleware:
+    """Reject requests whose body is larger than max_bytes without buffering it all"""
+    
+    too_large = JSONResponse({"detail": "Request body too large"}, status_code=413)
+    
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Declared size: reject before reading anything
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self.too_large(scope, receive, send)
+            return
+        
+        # Chunked uploads carry no Content-Length, so count bytes as they are read and stop
+        # at the limit; the HTTPException is rendered as the same 413 by FastAPI
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+# Initialize FastAPI
+app = FastAPI(
+    title="Ultra-Lightweight Coding Chatbot",
+    description="Optimized for low VRAM usage and fast responses",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Reject oversized bodies early (added first so CORS headers still wrap the 413)
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=config.MAX_BODY_BYTES)
+
+# Add CORS middleware AFTER app is defined
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # for dev; narrow down later if you want
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 # Global state
-current_backend = "ollama"
-current_model = config.DEFAULT_MODEL
+# (backend, model) is replaced as one tuple so readers never see a half-applied switch;
+# handlers unpack it once and use that snapshot for the whole request
+current_state: Tuple[str, str] = ("ollama", config.DEFAULT_MODEL)
+
+# Last Ollama health probe; the lock makes concurrent callers share one in-flight probe
+_health_cache = {"ts": 0.0, "ollama": False}
+_health_lock = asyncio.Lock()
 
 # Request/Response Models
 class ChatMessage(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+    
     role: str = Field(..., description="Role: system, user, or assistant")
-    content: str = Field(..., description="Message content")
+    content: str = Field(..., max_length=config.MAX_MESSAGE_CHARS, description="Message content")
 
 class ChatRequest(BaseModel):
-    messages: List[Union[ChatMessage, Dict[str, Any]]]
+    messages: List[ChatMessage] = Field(..., max_length=config.MAX_MESSAGES)
     model: Optional[str] = None
     stream: bool = True
     temperature: Optional[float] = None
     max_tokens: Optional[int] = None
-    
-    @field_validator('messages', mode='before')
-    @classmethod
-    def validate_messages(cls, v):
-        """Allow both ChatMessage objects and plain dicts"""
-        if not isinstance(v, list):
-            raise ValueError("messages must be a list")
-        
-        normalized = []
-        for msg in v:
-            if isinstance(msg, dict):
-                if 'role' not in msg or 'content' not in msg:
-                    raise ValueError("Each message must have 'role' and 'content' fields")
-                normalized.append(msg)
-            elif isinstance(msg, ChatMessage):
-                normalized.append({"role": msg.role, "content": msg.content})
-            else:
-                normalized.append(msg)
-        
-        return normalized
 
 class ModelInfo(BaseModel):
     name: str
@@ -105,15 +238,26 @@ class HealthResponse(BaseModel):
     timestamp: str
 
 # Utility Functions
-async def check_ollama_health() -> bool:
-    """Check if Ollama is available"""
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{config.OLLAMA_BASE_URL}/api/tags")
-            return response.status_code == 200
-    except Exception as e:
-        logger.warning(f"Ollama health check failed: {e}")
-        return False
+async def check_ollama_health(client: httpx.AsyncClient) -> bool:
+    """Check if Ollama is available (result cached for HEALTH_CACHE_TTL seconds)"""
+    if time.monotonic() - _health_cache["ts"] < config.HEALTH_CACHE_TTL:
+        return _health_cache["ollama"]
+    
+    async with _health_lock:
+        # Another request may have refreshed the cache while we waited for the lock
+        if time.monotonic() - _health_cache["ts"] < config.HEALTH_CACHE_TTL:
+            return _health_cache["ollama"]
+        
+        try:
+            response = await client.get("/api/tags", timeout=5.0)
+            ollama_ok = response.status_code == 200
+        except Exception as e:
+            logger.warning(f"Ollama health check failed: {e}")
+            ollama_ok = False
+        
+        _health_cache["ollama"] = ollama_ok
+        _health_cache["ts"] = time.monotonic()
+        return ollama_ok
 
 async def check_vllm_health() -> bool:
     return False
@@ -145,12 +289,97 @@ I'm a fallback mock assistant. Here's what I would help with:
 - `qwen:1.8b`
 """
 
-async def stream_ollama(messages: List[Dict], model: str, temperature: float) -> AsyncGenerator[str, None]:
+async def iter_lines(response: httpx.Response) -> AsyncGenerator[bytes, None]:
+    """Yield newline-delimited lines from a streaming response as raw bytes"""
+    buf = bytearray()
+    async for data in response.aiter_bytes():
+        buf += data
+        start = 0
+        while (nl := buf.find(b"\n", start)) != -1:
+            if nl > start:
+                yield bytes(buf[start:nl])
+            start = nl + 1
+        # Drop consumed lines once per read rather than once per line
+        del buf[:start]
+    if buf:
+        yield bytes(buf)
+
+async def drain_batch(pending: asyncio.Queue, first: bytes, deadline: float) -> Tuple[bytes, bool]:
+    """Join `first` with frames arriving before `deadline` (time.monotonic()); also reports whether the stream ended"""
+    batch = bytearray(first)
+    while len(batch) < config.COALESCE_MAX_BYTES:
+        try:
+            # Frames already queued join the batch for free, even once the deadline has passed
+            frame = pending.get_nowait()
+        except asyncio.QueueEmpty:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                frame = await asyncio.wait_for(pending.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+        if frame is None:
+            return bytes(batch), True
+        batch += frame
+    return bytes(batch), False
+
+async def with_heartbeat(frames: AsyncGenerator[bytes, None], interval: float, coalesce: float = 0.0) -> AsyncGenerator[bytes, None]:
+    """Relay SSE frames, sending a comment frame whenever the upstream is silent for `interval` seconds.
+    With `coalesce` > 0, frames arriving within that many seconds are sent as one write."""
+    # The upstream stream runs in its own task so a timeout never cancels a read mid-chunk.
+    # The queue is bounded so a slow browser backpressures the upstream read instead of buffering it all
+    pending: asyncio.Queue = asyncio.Queue(maxsize=32)
+    
+    async def produce():
+        cancelled = False
+        try:
+            async for frame in frames:
+                await pending.put(frame)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # Close the upstream response now rather than whenever the generator gets finalized
+            await frames.aclose()
+            # Only cancelled when the consumer has gone away, and then nobody waits for the sentinel
+            if not cancelled:
+                await pending.put(None)
+    
+    producer = asyncio.create_task(produce())
+    last_flush = 0.0
+    try:
+        while True:
+            try:
+                # wait_for creates a task per call, so only pay for it when the queue is empty
+                frame = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                try:
+                    frame = await asyncio.wait_for(pending.get(), interval)
+                except asyncio.TimeoutError:
+                    yield _SSE_HEARTBEAT
+                    continue
+            if frame is None:
+                break
+            if coalesce > 0:
+                # Leading edge: a frame arriving after a quiet period is sent at once; only frames
+                # within `coalesce` of the previous flush are held until that window closes
+                frame, finished = await drain_batch(pending, frame, last_flush + coalesce)
+                last_flush = time.monotonic()
+                yield frame
+                if finished:
+                    break
+                continue
+            yield frame
+        await producer
+    finally:
+        producer.cancel()
+
+async def stream_ollama(client: httpx.AsyncClient, messages: List[Dict], model: str, temperature: float) -> AsyncGenerator[bytes, None]:
     """Stream responses from Ollama"""
-    url = f"{config.OLLAMA_BASE_URL}/api/chat"
     payload = {
         "model": model,
-        "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+        "messages": messages,  # Already role/content dicts from ChatRequest.model_dump
         "stream": True,
         "options": {
             "temperature": temperature,
@@ -160,54 +389,55 @@ async def stream_ollama(messages: List[Dict], model: str, temperature: float) ->
     }
     
     try:
-        async with httpx.AsyncClient(timeout=config.REQUEST_TIMEOUT) as client:
-            async with client.stream("POST", url, json=payload) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"Ollama error: {error_text}")
-                    error_json = json.dumps({"error": f"Ollama error: {response.status_code}"})
-                    yield f"data: {error_json}\n\n"
-                    return
+        async with client.stream("POST", "/api/chat", json=payload) as response:
+            if response.status_code != 200:
+                error_text = await response.aread()
+                logger.error(f"Ollama error: {error_text}")
+                yield _sse_err(f"Ollama error: {response.status_code}")
+                return
+            
+            async for chunk in iter_lines(response):
+                if not config.STREAM_DEBUG:
+                    # Skip empty keepalive chunks with a substring check instead of a parse
+                    if _OLLAMA_EMPTY_MESSAGE in chunk and _OLLAMA_NOT_DONE in chunk:
+                        continue
+                    # Forward Ollama's JSON untouched; the frontend reads message.content itself
+                    yield _SSE_FRAME % chunk
+                    continue
                 
-                async for chunk in response.aiter_lines():
-                    if chunk:
-                        try:
-                            # Log raw chunk for debugging
-                            logger.debug(f"Raw Ollama chunk: {chunk[:100]}")
-                            
-                            # Parse the Ollama response
-                            data = json.loads(chunk)
-                            
-                            # Extract content from message
-                            if "message" in data and "content" in data["message"]:
-                                content = data["message"]["content"]
-                                done = data.get("done", False)
-                                
-                                # Format for frontend
-                                response_data = {
-                                    "content": content,
-                                    "done": done
-                                }
-                                formatted = f"data: {json.dumps(response_data)}\n\n"
-                                logger.debug(f"Sending to frontend: {formatted[:100]}")
-                                yield formatted
-                            elif "done" in data and data["done"]:
-                                # Final done message
-                                formatted = f"data: {json.dumps({'done': True})}\n\n"
-                                logger.debug(f"Sending final done: {formatted}")
-                                yield formatted
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Failed to parse chunk: {chunk}, error: {e}")
+                try:
+                    # Log raw chunk for debugging
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Raw Ollama chunk: %.100s", chunk)
+                    
+                    # Parse the Ollama response
+                    data = orjson.loads(chunk)
+                    
+                    # Extract content from message
+                    if "message" in data and "content" in data["message"]:
+                        content = data["message"]["content"]
+                        done = data.get("done", False)
+                        if not content and not done:
                             continue
+                        
+                        # Format for frontend
+                        response_data = {
+                            "content": content,
+                            "done": done
+                        }
+                        yield _SSE_FRAME % orjson.dumps(response_data)
+                    elif "done" in data and data["done"]:
+                        # Final done message
+                        yield _SSE_DONE
+                except orjson.JSONDecodeError as e:
+                    logger.warning(f"Failed to parse chunk: {chunk}, error: {e}")
+                    continue
     except Exception as e:
         logger.error(f"Ollama streaming error: {e}")
-        error_json = json.dumps({"error": f"Connection failed: {str(e)}"})
-        yield f"data: {error_json}\n\n"
+        yield _sse_err(f"Connection failed: {str(e)}")
 
-async def stream_vllm(messages: List[Dict], model: str, temperature: float) -> AsyncGenerator[str, None]:
+async def stream_vllm(client: httpx.AsyncClient, messages: List[Dict], model: str, temperature: float) -> AsyncGenerator[bytes, None]:
     """Stream responses from vLLM"""
-    url = f"{config.VLLM_BASE_URL}/v1/chat/completions"
-    
     # Convert messages to vLLM format
     payload = {
         "model": model,
@@ -218,32 +448,32 @@ async def stream_vllm(messages: List[Dict], model: str, temperature: float) -> A
     }
     
     try:
-        async with httpx.AsyncClient(timeout=config.REQUEST_TIMEOUT) as client:
-            async with client.stream("POST", url, json=payload) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"vLLM error: {error_text}")
-                    yield f"data: {{'error': 'vLLM error: {response.status_code}'}}\n\n"
-                    return
-                
-                async for chunk in response.aiter_lines():
-                    if chunk and chunk.startswith("data: "):
-                        yield f"{chunk}\n\n"
+        async with client.stream("POST", "/v1/chat/completions", json=payload) as response:
+            if response.status_code != 200:
+                error_text = await response.aread()
+                logger.error(f"vLLM error: {error_text}")
+                yield _sse_err(f"vLLM error: {response.status_code}")
+                return
+            
+            async for chunk in iter_lines(response):
+                if chunk.startswith(_SSE_PREFIX):
+                    yield chunk + _SSE_SUFFIX
     except Exception as e:
         logger.error(f"vLLM streaming error: {e}")
-        yield f"data: {{'error': 'Connection failed: {str(e)}'}}\n\n"
+        yield _sse_err(f"Connection failed: {str(e)}")
 
 # API Endpoints
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
+async def health_check(request: Request):
     """Health check endpoint with backend status"""
-    ollama_ok = await check_ollama_health()
+    ollama_ok = await check_ollama_health(request.app.state.ollama)
     vllm_ok = await check_vllm_health()
+    backend, model = current_state
     
     return HealthResponse(
         status="healthy" if (ollama_ok or vllm_ok or config.MOCK_MODE) else "degraded",
-        backend=current_backend,
-        model=current_model,
+        backend=backend,
+        model=model,
         ollama_available=ollama_ok,
         vllm_available=vllm_ok,
         timestamp=datetime.utcnow().isoformat()
@@ -253,65 +483,93 @@ async def health_check():
 async def chat(request: Request):
     """Main chat endpoint with streaming support - accepts raw JSON"""
     start_time = time.time()
+    backend, default_model = current_state
     
     try:
-        # Parse raw JSON body
-        body = await request.json()
-        logger.info(f"Received chat request body: {json.dumps(body)[:200]}")
+        # Read raw JSON body
+        body_bytes = await request.body()
+        logger.info(f"Received chat request body: {body_bytes[:200].decode(errors='replace')}")
         
         # Handle both frontend formats:
-        # 1. {"message": "text"} - simple format from frontend
-        # 2. {"messages": [{role, content}]} - standard format
-        if "message" in body and "messages" not in body:
-            # Convert simple format to standard format
-            body["messages"] = [{"role": "user", "content": body["message"]}]
-            logger.info("Converted simple message format to messages array")
+        # 1. {"messages": [{role, content}]} - standard format
+        # 2. {"message": "text"} - simple format from frontend
+        chat_req = None
+        if b'"messages"' in body_bytes:
+            # Parse and validate in a single pass inside pydantic-core
+            try:
+                chat_req = ChatRequest.model_validate_json(body_bytes)
+            except ValidationError as e:
+                errors = e.errors()
+                json_error = next((err for err in errors if err["type"] == "json_invalid"), None)
+                if json_error:
+                    logger.error(f"JSON decode error: {json_error['msg']}")
+                    raise HTTPException(status_code=400, detail=json_error["msg"])
+                # "messages" only appeared inside a value (e.g. a simple-format body); fall back below
+                if not all(err["type"] == "missing" and err["loc"] == ("messages",) for err in errors):
+                    raise
         
-        # Validate and parse with Pydantic
-        chat_req = ChatRequest(**body)
+        if chat_req is None:
+            body = orjson.loads(body_bytes)
+            if "message" in body:
+                # Convert simple format to standard format
+                body["messages"] = [{"role": "user", "content": body["message"]}]
+                logger.info("Converted simple message format to messages array")
+            chat_req = ChatRequest.model_validate(body)
         
         # Use provided model or default
-        model = chat_req.model or current_model
+        model = chat_req.model or default_model
         temperature = chat_req.temperature or config.TEMPERATURE
         
-        logger.info(f"Chat request - Backend: {current_backend}, Model: {model}, Messages: {len(chat_req.messages)}")
+        logger.info(f"Chat request - Backend: {backend}, Model: {model}, Messages: {len(chat_req.messages)}")
         
-        # Ensure messages are in dict format
-        messages = []
-        for m in chat_req.messages:
-            if isinstance(m, dict):
-                messages.append({"role": m["role"], "content": m["content"]})
-            else:
-                messages.append({"role": m.role, "content": m.content})
+        # Plain role/content dicts for the backend payloads
+        messages = chat_req.model_dump(include={'messages'})['messages']
         
         # Mock mode fallback
         if config.MOCK_MODE:
             last_user_msg = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
             mock_resp = get_mock_response(last_user_msg)
             
+            # Pre-build small token frames so the mock streams like a real backend
+            tokens = [mock_resp[i:i + 24] for i in range(0, len(mock_resp), 24)]
+            frames = [_SSE_FRAME % orjson.dumps({"content": t, "done": False}) for t in tokens]
+            frames.append(_SSE_DONE)
+            
             async def mock_stream():
-                yield f"data: {{'message': {{'role': 'assistant', 'content': '{mock_resp}'}}, 'done': false}}\n\n"
-                yield f"data: {{'done': true}}\n\n"
+                for frame in frames:
+                    yield frame
+                    await asyncio.sleep(0)
             
-            return StreamingResponse(mock_stream(), media_type="text/event-stream")
+            return StreamingResponse(mock_stream(), media_type="text/event-stream", headers=_SSE_HEADERS)
         
         # Route to appropriate backend
         if chat_req.stream:
-            if current_backend == "ollama":
+            if backend == "ollama":
                 return StreamingResponse(
-                    stream_ollama(messages, model, temperature),
-                    media_type="text/event-stream"
+                    with_heartbeat(
+                        stream_ollama(request.app.state.ollama, messages, model, temperature),
+                        config.SSE_HEARTBEAT_INTERVAL,
+                        coalesce=config.OLLAMA_COALESCE_MS / 1000
+                    ),
+                    media_type="text/event-stream",
+                    headers=_SSE_HEADERS
                 )
             else:
                 return StreamingResponse(
-                    stream_vllm(messages, model, temperature),
-                    media_type="text/event-stream"
+                    with_heartbeat(
+                        stream_vllm(request.app.state.vllm, messages, model, temperature),
+                        config.SSE_HEARTBEAT_INTERVAL
+                    ),
+                    media_type="text/event-stream",
+                    headers=_SSE_HEADERS
                 )
         else:
             # Non-streaming response (less common)
             raise HTTPException(status_code=400, detail="Non-streaming mode not implemented. Use stream=true")
     
-    except json.JSONDecodeError as e:
+    except HTTPException:
+        raise
+    except orjson.JSONDecodeError as e:
         logger.error(f"JSON decode error: {e}")
         raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
     except ValueError as e:
@@ -324,48 +582,44 @@ async def chat(request: Request):
 @app.post("/models/switch")
 async def switch_model(model_name: str, backend: Optional[str] = None):
     """Switch the active model and/or backend"""
-    global current_model, current_backend
+    global current_state
     
     if backend and backend not in ["ollama", "vllm"]:
         raise HTTPException(status_code=400, detail="Backend must be 'ollama' or 'vllm'")
     
-    old_model = current_model
-    old_backend = current_backend
-    
-    current_model = model_name
-    if backend:
-        current_backend = backend
+    old_backend, old_model = current_state
+    new_backend = backend or old_backend
+    current_state = (new_backend, model_name)
     
-    logger.info(f"Model switched: {old_backend}/{old_model} -> {current_backend}/{current_model}")
+    logger.info(f"Model switched: {old_backend}/{old_model} -> {new_backend}/{model_name}")
     
     return {
         "status": "success",
         "previous": {"backend": old_backend, "model": old_model},
-        "current": {"backend": current_backend, "model": current_model}
+        "current": {"backend": new_backend, "model": model_name}
     }
 
 @app.get("/models/list")
-async def list_models():
+async def list_models(request: Request):
     """List available models from the current backend"""
+    backend, _ = current_state
     try:
-        if current_backend == "ollama":
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(f"{config.OLLAMA_BASE_URL}/api/tags")
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "backend": "ollama",
-                        "models": [m["name"] for m in data.get("models", [])]
-                    }
+        if backend == "ollama":
+            response = await request.app.state.ollama.get("/api/tags", timeout=10.0)
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "backend": "ollama",
+                    "models": [m["name"] for m in data.get("models", [])]
+                }
         else:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(f"{config.VLLM_BASE_URL}/v1/models")
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "backend": "vllm",
-                        "models": [m["id"] for m in data.get("data", [])]
-                    }
+            response = await request.app.state.vllm.get("/v1/models", timeout=10.0)
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "backend": "vllm",
+                    "models": [m["id"] for m in data.get("data", [])]
+                }
     except Exception as e:
         logger.error(f"Failed to list models: {e}")
         raise HTTPException(status_code=503, detail=f"Backend unavailable: {str(e)}")
@@ -373,60 +627,106 @@ async def list_models():
 @app.get("/models/current")
 async def get_current_model():
     """Get currently active model"""
+    backend, model = current_state
     return ModelInfo(
-        name=current_model,
-        backend=current_backend,
+        name=model,
+        backend=backend,
         status="active"
     )
 
 @app.get("/logs/recent")
 async def get_recent_logs(lines: int = 50):
     """Get recent log entries"""
-    try:
-        with open('chatbot.log', 'r') as f:
-            all_lines = f.readlines()
-            return {"logs": all_lines[-lines:]}
-    except Exception as e:
-        return {"error": str(e), "logs": []}
+    recent = itertools.islice(reversed(ring_handler.buf), max(lines, 0))
+    return {"logs": list(recent)[::-1]}
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Parse an Accept-Encoding header into the codings it allows (q=0 means refused)"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+class StaticGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that also honours gzip;q=0 (Starlette only does a substring check)"""
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and "gzip" not in accepted_encodings(Headers(scope=scope).get("accept-encoding", "")):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves a pre-built .br/.gz sibling when the client accepts it"""
+    
+    encodings = (("br", ".br"), ("gzip", ".gz"))
+    
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        has_sibling = False
+        if status_code == 200:
+            for encoding, suffix in self.encodings:
+                compressed_path = f"{full_path}{suffix}"
+                try:
+                    compressed_stat = os.stat(compressed_path)
+                except OSError:
+                    continue
+                has_sibling = True
+                if encoding not in accepted:
+                    continue
+                
+                compressed = FileResponse(
+                    compressed_path,
+                    stat_result=compressed_stat,
+                    media_type=guess_type(str(full_path))[0] or "text/plain",
+                    headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+                    method=scope["method"]
+                )
+                if self.is_not_modified(compressed.headers, request_headers):
+                    return NotModifiedResponse(compressed.headers)
+                return compressed
+        
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if has_sibling:
+            # The identity copy (or its 304) depends on Accept-Encoding too, so shared caches must key on it
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
 
 # Mount static files for web UI
 # Mount built frontend (Vite build)
 frontend_dir = os.path.join(os.path.dirname(__file__), "../frontend/dist")
 if os.path.exists(frontend_dir):
-    app.mount("/", StaticFiles(directory=frontend_dir, html=True), name="frontend")
+    # Pre-compressed files are served as-is; GZip only covers assets without a sibling and stays
+    # off the API routes so SSE streams are never buffered by the compressor
+    app.mount(
+        "/",
+        StaticGZipMiddleware(PrecompressedStaticFiles(directory=frontend_dir, html=True), minimum_size=1024),
+        name="frontend"
+    )
     logger.info("✓ Frontend UI mounted successfully from /frontend/dist")
 else:
     logger.warning("Frontend build not found. Run 'npm run build' in the frontend folder.")
 
-@app.on_event("startup")
-async def startup_event():
-    """Log startup information"""
-    logger.info("="*50)
-    logger.info("Ultra-Lightweight Coding Chatbot Started")
-    logger.info(f"Default Backend: {current_backend}")
-    logger.info(f"Default Model: {current_model}")
-    logger.info(f"Ollama URL: {config.OLLAMA_BASE_URL}")
-    logger.info(f"vLLM URL: {config.VLLM_BASE_URL}")
-    logger.info(f"Mock Mode: {config.MOCK_MODE}")
-    logger.info("="*50)
-    
-    # Check backend availability
-    ollama_ok = await check_ollama_health()
-    vllm_ok = await check_vllm_health()
-    
-    if not ollama_ok and not vllm_ok and not config.MOCK_MODE:
-        logger.warning("⚠️  No backends available! Enable MOCK_MODE or start Ollama/vLLM")
-    elif ollama_ok:
-        logger.info("✓ Ollama is available")
-    elif vllm_ok:
-        logger.info("✓ vLLM is available")
-
 if __name__ == "__main__":
+    import sys
     import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8080,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",  # uvloop is not available on Windows
+        http="httptools",
         log_level="info",
         reload=False  # Disable in production
     )
\ No newline at end of file
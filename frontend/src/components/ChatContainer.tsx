@@ -75,8 +75,10 @@ const ChatContainer: React.FC = () => {
                 throw new Error(data.error);
               }
               
-              if (data.content) {
-                accumulatedContent += data.content;
+              // Ollama chunks are forwarded as-is ({ message: { content } }); other backends send { content }
+              const content = data.message?.content ?? data.content;
+              if (content) {
+                accumulatedContent += content;
                 updateLastAIMessage(accumulatedContent);
               }
               
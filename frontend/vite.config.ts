@@ -1,14 +1,36 @@
-import { defineConfig } from "vite";
+import { defineConfig, type Plugin } from "vite";
 import dyadComponentTagger from "@dyad-sh/react-vite-component-tagger";
 import react from "@vitejs/plugin-react-swc";
+import fs from "fs";
 import path from "path";
+import { brotliCompressSync, constants as zlibConstants, gzipSync } from "zlib";
+
+// Write .gz/.br siblings next to built assets so the backend can serve them without compressing per request
+const precompress = (): Plugin => ({
+  name: "precompress",
+  apply: "build",
+  writeBundle(options, bundle) {
+    const outDir = options.dir ?? path.resolve(__dirname, "dist");
+    for (const fileName of Object.keys(bundle)) {
+      if (!/\.(js|css|html|svg|json)$/.test(fileName)) continue;
+      const filePath = path.join(outDir, fileName);
+      const source = fs.readFileSync(filePath);
+      if (source.length < 1024) continue;
+      fs.writeFileSync(`${filePath}.gz`, gzipSync(source, { level: 9 }));
+      fs.writeFileSync(
+        `${filePath}.br`,
+        brotliCompressSync(source, { params: { [zlibConstants.BROTLI_PARAM_QUALITY]: 11 } }),
+      );
+    }
+  },
+});
 
 export default defineConfig(() => ({
   server: {
     host: "::",
     port: 8080,
   },
-  plugins: [dyadComponentTagger(), react()],
+  plugins: [dyadComponentTagger(), react(), precompress()],
   resolve: {
     alias: {
       "@": path.resolve(__dirname, "./src"),